@@ -2,7 +2,12 @@ from flask import Flask, jsonify, request
 import requests
 from dotenv import load_dotenv
 import os
-from collections import defaultdict
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
 from datetime import datetime
 
 # Load environment variables
@@ -19,9 +24,293 @@ if not LOCATIONIQ_KEY:
 
 BASE_URL = "http://api.openweathermap.org/data/2.5/weather"
 FORECAST_URL = "http://api.openweathermap.org/data/2.5/forecast"
+GEOCODE_URL = "http://api.openweathermap.org/geo/1.0/direct"
+
+# --- Watch-list settings (overridable from .env) ---
+WATCH_REFRESH_SECONDS = int(os.getenv("WatchRefreshSeconds", "600"))  # Base refresh interval per location
+WATCH_JITTER = 0.2                                                     # +/- fraction applied to each interval
+WATCH_MAX_LOCATIONS = int(os.getenv("WatchMaxLocations", "10"))
+API_CALLS_PER_HOUR = int(os.getenv("ApiCallsPerHour", "300"))          # Budget shared by clicks and the scheduler
+SNAPSHOT_MAX_AGE = WATCH_REFRESH_SECONDS * 2                           # Older snapshots are re-fetched on read
+RESOLVED_MAX = 500                                                     # Cached city name -> coordinate lookups
+
+if WATCH_REFRESH_SECONDS <= 0:
+    raise ValueError("WatchRefreshSeconds must be greater than 0")
+if API_CALLS_PER_HOUR < 2:
+    raise ValueError("ApiCallsPerHour must be at least 2 (one refresh costs two calls)")
+
+INSTANCE_ID = uuid.uuid4().hex  # Lets clients notice a backend restart
 
 app = Flask(__name__)
 
+# --- Call budget: sliding one-hour window of upstream calls ---
+class CallBudget:
+    def __init__(self, per_hour):
+        self.per_hour = per_hour
+        self.calls = deque()
+        self.lock = threading.Lock()
+
+    def _trim(self, now):
+        while self.calls and now - self.calls[0] >= 3600:
+            self.calls.popleft()
+
+    def record(self, n=1):
+        """Record calls that must happen regardless of budget (user clicks)."""
+        with self.lock:
+            now = time.time()
+            self._trim(now)
+            self.calls.extend([now] * n)
+
+    def try_acquire(self, n):
+        """Reserve n calls if they fit in the budget; used by the scheduler."""
+        with self.lock:
+            now = time.time()
+            self._trim(now)
+            if len(self.calls) + n > self.per_hour:
+                return False
+            self.calls.extend([now] * n)
+            return True
+
+    def seconds_until_free(self, n):
+        with self.lock:
+            now = time.time()
+            self._trim(now)
+            over = len(self.calls) + n - self.per_hour
+            if over <= 0:
+                return 0
+            if over > len(self.calls):  # n alone exceeds the budget
+                return 3600
+            return 3600 - (now - self.calls[over - 1])
+
+# --- Snapshot store: latest weather/forecast per pinned location ---
+class SnapshotStore:
+    def __init__(self):
+        self.snapshots = {}  # key -> {"weather", "forecast", "<kind>_updated", "updated", "version"}
+        self.version = 0
+        self.changed = threading.Condition()
+
+    def get(self, key):
+        with self.changed:
+            snap = self.snapshots.get(key)
+            return dict(snap) if snap else None
+
+    def put(self, key, **payloads):
+        """Store fresh payloads, wake any long-poll waiters and return the new version."""
+        with self.changed:
+            snap = self.snapshots.setdefault(key, {"key": key, "weather": None, "forecast": None})
+            snap.update(payloads)
+            now = time.time()
+            for kind in payloads:
+                snap[f"{kind}_updated"] = now  # Freshness is tracked per payload
+            snap["updated"] = now
+            self.version += 1
+            snap["version"] = self.version
+            self.changed.notify_all()
+            return self.version
+
+    def discard(self, key):
+        with self.changed:
+            self.snapshots.pop(key, None)
+
+    def prune(self, keep, max_age):
+        """Drop snapshots not in `keep` (the watch-list) that are older than max_age."""
+        cutoff = time.time() - max_age
+        with self.changed:
+            for key in [k for k, s in self.snapshots.items() if k not in keep and s["updated"] < cutoff]:
+                del self.snapshots[key]
+
+    def wait_for_changes(self, since, timeout):
+        """Block until something newer than `since` exists (or timeout); return (version, snapshots)."""
+        with self.changed:
+            if since > self.version:  # Backend restarted; client must resync everything
+                since = 0
+            self.changed.wait_for(lambda: self.version > since, timeout=timeout)
+            updates = [dict(s) for s in self.snapshots.values() if s["version"] > since]
+            return self.version, updates
+
+budget = CallBudget(API_CALLS_PER_HOUR)
+store = SnapshotStore()
+resolved = {}   # lowercased city query -> (lat, lon, name)
+resolved_lock = threading.Lock()
+watch_list = {}  # key -> {"key", "city", "lat", "lon", "next_due", "last_viewed"}
+watch_lock = threading.Lock()
+scheduler_wakeup = threading.Event()
+scheduler_thread = None
+
+def location_key(lat, lon):
+    return f"{lat:.4f},{lon:.4f}"
+
+# --- Upstream helpers (always query by coordinates once resolved) ---
+def owm_get(url, params, use_budget=False):
+    """GET an OpenWeatherMap endpoint. Scheduler calls are budget-checked up front."""
+    if not use_budget:
+        budget.record()
+    response = requests.get(url, params={**params, "appid": OPENWEATHER_KEY}, timeout=5)
+    return response.json()
+
+def resolve_city(city):
+    """Resolve a city name to pinned coordinates once; later lookups are free."""
+    query = city.strip().lower()
+    with resolved_lock:
+        if query in resolved:
+            return resolved[query]
+    data = owm_get(GEOCODE_URL, {"q": city, "limit": 1})
+    if not isinstance(data, list) or not data:
+        raise LookupError("City not found")
+    place = (data[0]["lat"], data[0]["lon"], data[0].get("name", city))
+    with resolved_lock:
+        if query not in resolved and len(resolved) >= RESOLVED_MAX:
+            resolved.pop(next(iter(resolved)))
+        resolved[query] = place
+    return place
+
+def resolve_request_location(body):
+    if "lat" in body and "lon" in body:
+        try:
+            lat, lon = float(body["lat"]), float(body["lon"])
+        except (TypeError, ValueError):
+            raise ValueError("'lat' and 'lon' must both be numbers")
+        if not (math.isfinite(lat) and math.isfinite(lon) and -90 <= lat <= 90 and -180 <= lon <= 180):
+            raise ValueError("'lat'/'lon' out of range")
+        return lat, lon, body.get("city") or location_key(lat, lon)
+    city = body.get("city")
+    if not city:
+        raise ValueError("Please enter a city name")
+    return resolve_city(city)
+
+def fetch_weather(lat, lon, use_budget=False):
+    data = owm_get(BASE_URL, {"lat": lat, "lon": lon, "units": "metric"}, use_budget)  # Celsius
+    if data.get("cod") != 200:
+        raise LookupError(data.get("message", "City not found"))
+
+    # Construct the secure map URL on the backend
+    map_url = (
+        f"https://maps.locationiq.com/v3/staticmap?"
+        f"key={LOCATIONIQ_KEY}&"
+        f"center={lat},{lon}&"
+        f"zoom=13&size=600x400&format=png&"
+        f"markers=icon:default|{lat},{lon}"
+    )
+
+    return {
+        "key": location_key(lat, lon),
+        "city": data["name"],
+        "temp": data["main"]["temp"],
+        "humidity": data["main"]["humidity"],
+        "description": data["weather"][0]["description"],
+        "icon": data["weather"][0]["icon"],
+        "lat": lat,
+        "lon": lon,
+        "map_url": map_url
+    }
+
+def fetch_forecast(lat, lon, use_budget=False):
+    data = owm_get(FORECAST_URL, {"lat": lat, "lon": lon, "units": "metric"}, use_budget)
+    if data.get("cod") != "200":
+        raise LookupError(data.get("message", "City not found"))
+
+    daily_data = defaultdict(lambda: {"temps": [], "descriptions": []})
+    for item in data['list']:
+        date = item['dt_txt'][:10]
+        daily_data[date]["temps"].append(item['main']['temp'])
+        daily_data[date]["descriptions"].append(item['weather'][0]['description'])
+
+    forecast = []
+    for date in sorted(daily_data.keys())[:5]:
+        temps = daily_data[date]["temps"]
+        descriptions = daily_data[date]["descriptions"]
+        description = max(set(descriptions), key=descriptions.count)
+        day_of_week = datetime.strptime(date, "%Y-%m-%d").strftime("%A")
+        forecast.append({
+            "date": date, "day": day_of_week, "min_temp": min(temps),
+            "max_temp": max(temps), "description": description,
+            "icon": data['list'][0]['weather'][0]['icon']
+        })
+
+    return {"key": location_key(lat, lon), "city": data['city']['name'], "forecast": forecast}
+
+def snapshot_or_fetch(kind, lat, lon):
+    """Serve from the snapshot store when fresh; otherwise fetch and store. Returns (payload, version)."""
+    key = location_key(lat, lon)
+    with watch_lock:
+        if key in watch_list:
+            watch_list[key]["last_viewed"] = time.time()
+    snap = store.get(key)
+    if snap and snap[kind] is not None and time.time() - snap[f"{kind}_updated"] < SNAPSHOT_MAX_AGE:
+        return snap[kind], snap["version"]
+    payload = (fetch_weather if kind == "weather" else fetch_forecast)(lat, lon)
+    prune_snapshots()
+    return payload, store.put(key, **{kind: payload})
+
+def prune_snapshots():
+    """Keep the store bounded: unwatched snapshots live only until they go stale."""
+    with watch_lock:
+        keep = set(watch_list)
+    store.prune(keep, SNAPSHOT_MAX_AGE)
+
+# --- Background scheduler for the watch-list ---
+def next_refresh_time():
+    return time.time() + WATCH_REFRESH_SECONDS * random.uniform(1 - WATCH_JITTER, 1 + WATCH_JITTER)
+
+def is_watched(entry):
+    with watch_lock:
+        return watch_list.get(entry["key"]) is entry
+
+def refresh_location(entry):
+    lat, lon = entry["lat"], entry["lon"]
+    weather, forecast = fetch_weather(lat, lon, True), fetch_forecast(lat, lon, True)
+    with watch_lock:
+        # Removed or evicted while fetching: don't resurrect its snapshot
+        if watch_list.get(entry["key"]) is entry:
+            store.put(entry["key"], weather=weather, forecast=forecast)
+
+def scheduler_pass():
+    """Refresh every due entry that fits in the budget; returns (any_due, next_due_time)."""
+    with watch_lock:
+        now = time.time()
+        due = [e for e in watch_list.values() if e["next_due"] <= now]
+        upcoming = min((e["next_due"] for e in watch_list.values()), default=now + WATCH_REFRESH_SECONDS)
+
+    for i, entry in enumerate(due):
+        if not is_watched(entry):
+            continue
+        if not budget.try_acquire(2):
+            # Out of budget: push the rest back until calls free up
+            delay = max(budget.seconds_until_free(2), 1)
+            with watch_lock:
+                for e in due[i:]:
+                    e["next_due"] = time.time() + delay * random.uniform(1, 1 + WATCH_JITTER)
+            break
+        try:
+            refresh_location(entry)
+        except Exception as e:
+            print(f"Error refreshing {entry['city']}: {e}")
+        with watch_lock:
+            entry["next_due"] = next_refresh_time()
+
+    prune_snapshots()
+    return bool(due), upcoming
+
+def scheduler_loop():
+    while True:
+        try:
+            any_due, upcoming = scheduler_pass()
+        except Exception as e:
+            # Never let one bad pass kill the thread
+            print(f"Error in watch scheduler: {e}")
+            any_due, upcoming = False, time.time() + 5
+        if not any_due:
+            scheduler_wakeup.wait(timeout=max(upcoming - time.time(), 0.5))
+            scheduler_wakeup.clear()
+
+def ensure_scheduler():
+    """Start the scheduler on first use (avoids a duplicate thread in the debug reloader)."""
+    global scheduler_thread
+    with watch_lock:
+        if scheduler_thread is None:
+            scheduler_thread = threading.Thread(target=scheduler_loop, name="watch-scheduler", daemon=True)
+            scheduler_thread.start()
+
 # --- NEW: Secure endpoint for autocomplete suggestions ---
 @app.route("/api/autocomplete", methods=["GET"])
 def get_autocomplete():
@@ -41,45 +330,14 @@ def get_autocomplete():
 # --- MODIFIED: Weather endpoint now also generates the map URL ---
 @app.route("/api/weather", methods=["POST"])
 def get_weather():
-    city = request.json.get("city")
-    if not city:
-        return jsonify({"error": "Please enter a city name"}), 400
-
     try:
-        response = requests.get(BASE_URL, params={
-            "q": city,
-            "appid": OPENWEATHER_KEY,
-            "units": "metric"  # Celsius
-        })
-        data = response.json()
-
-        if data.get("cod") != 200:
-            return jsonify({"error": data.get("message", "City not found")}), 404
-
-        lat = data["coord"]["lat"]
-        lon = data["coord"]["lon"]
-        
-        # Construct the secure map URL on the backend
-        map_url = (
-            f"https://maps.locationiq.com/v3/staticmap?"
-            f"key={LOCATIONIQ_KEY}&"
-            f"center={lat},{lon}&"
-            f"zoom=13&size=600x400&format=png&"
-            f"markers=icon:default|{lat},{lon}"
-        )
-
-        weather = {
-            "city": data["name"],
-            "temp": data["main"]["temp"],
-            "humidity": data["main"]["humidity"],
-            "description": data["weather"][0]["description"],
-            "icon": data["weather"][0]["icon"],
-            "lat": lat,
-            "lon": lon,
-            "map_url": map_url
-        }
-        return jsonify(weather), 200
-
+        lat, lon, _ = resolve_request_location(request.get_json(silent=True) or {})
+        payload, version = snapshot_or_fetch("weather", lat, lon)
+        return jsonify({**payload, "version": version}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         print("Error in /api/weather:", e)
         return jsonify({"error": "Error fetching weather data"}), 500
@@ -87,46 +345,79 @@ def get_weather():
 # --- Forecast endpoint ---
 @app.route("/api/forecast", methods=["POST"])
 def get_forecast():
-    city = request.json.get("city")
-    if not city:
-        return jsonify({"error": "Please enter a city name"}), 400
-
     try:
-        response = requests.get(FORECAST_URL, params={
-            "q": city,
-            "appid": OPENWEATHER_KEY,
-            "units": "metric"
-        })
-        data = response.json()
-
-        if data.get("cod") != "200":
-            return jsonify({"error": data.get("message", "City not found")}), 404
-
-        daily_data = defaultdict(lambda: {"temps": [], "descriptions": []})
-        for item in data['list']:
-            date = item['dt_txt'][:10]
-            daily_data[date]["temps"].append(item['main']['temp'])
-            daily_data[date]["descriptions"].append(item['weather'][0]['description'])
-
-        forecast = []
-        for date in sorted(daily_data.keys())[:5]:
-            temps = daily_data[date]["temps"]
-            descriptions = daily_data[date]["descriptions"]
-            description = max(set(descriptions), key=descriptions.count)
-            day_of_week = datetime.strptime(date, "%Y-%m-%d").strftime("%A")
-            forecast.append({
-                "date": date, "day": day_of_week, "min_temp": min(temps),
-                "max_temp": max(temps), "description": description,
-                "icon": data['list'][0]['weather'][0]['icon']
-            })
-
-        return jsonify({"city": data['city']['name'], "forecast": forecast}), 200
-
+        lat, lon, _ = resolve_request_location(request.get_json(silent=True) or {})
+        payload, version = snapshot_or_fetch("forecast", lat, lon)
+        return jsonify({**payload, "version": version}), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
     except Exception as e:
         print("Error in /api/forecast:", e)
         return jsonify({"error": "Error fetching forecast data"}), 500
 
+# --- Watch-list endpoints ---
+@app.route("/api/watch", methods=["GET"])
+def list_watch():
+    with watch_lock:
+        entries = [{k: e[k] for k in ("key", "city", "lat", "lon", "next_due")} for e in watch_list.values()]
+    return jsonify({"watch": entries, "budget_per_hour": API_CALLS_PER_HOUR}), 200
+
+@app.route("/api/watch", methods=["POST"])
+def add_watch():
+    try:
+        lat, lon, city = resolve_request_location(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        print("Error in /api/watch:", e)
+        return jsonify({"error": "Error resolving location"}), 500
+
+    ensure_scheduler()
+    key = location_key(lat, lon)
+    with watch_lock:
+        if key not in watch_list:
+            if len(watch_list) >= WATCH_MAX_LOCATIONS:
+                # Drop the location nobody has looked at for the longest
+                stale = min(watch_list.values(), key=lambda e: e["last_viewed"])
+                del watch_list[stale["key"]]
+                store.discard(stale["key"])
+            snap = store.get(key)
+            fresh = (
+                snap and snap["weather"] and snap["forecast"]
+                and time.time() - min(snap["weather_updated"], snap["forecast_updated"]) < WATCH_REFRESH_SECONDS
+            )
+            watch_list[key] = {
+                "key": key, "city": city, "lat": lat, "lon": lon,
+                "next_due": next_refresh_time() if fresh else time.time(),
+                "last_viewed": time.time(),
+            }
+        entry = dict(watch_list[key])
+    scheduler_wakeup.set()
+    return jsonify(entry), 201
+
+@app.route("/api/watch", methods=["DELETE"])
+def remove_watch():
+    key = (request.get_json(silent=True) or {}).get("key")
+    with watch_lock:
+        removed = watch_list.pop(key, None)
+    store.discard(key)
+    if not removed:
+        return jsonify({"error": "Location is not on the watch-list"}), 404
+    return jsonify({"removed": key}), 200
+
+# --- Change notifications (long-poll) ---
+@app.route("/api/updates", methods=["GET"])
+def get_updates():
+    since = request.args.get("since", 0, type=int)
+    timeout = min(request.args.get("timeout", 25, type=float), 60)
+    version, updates = store.wait_for_changes(since, timeout)
+    return jsonify({"instance": INSTANCE_ID, "version": version, "updates": updates}), 200
+
 # --- This block makes the server run ---
 if __name__ == "__main__":
     print("🚀 Starting Flask backend server at http://127.0.0.1:5000")
-    app.run(port=5000, debug=True)
\ No newline at end of file
+    app.run(port=5000, debug=True, threaded=True)
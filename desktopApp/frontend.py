@@ -7,17 +7,100 @@ from io import BytesIO
 from dotenv import load_dotenv
 import os
 import re
+import argparse
+import time
+import tracemalloc
+import threading
+import queue
+from collections import OrderedDict, deque
 
 # Load environment variables from .env file
 load_dotenv()
 
+BACKEND_URL = "http://localhost:5000"
+REQUEST_TIMEOUT = 15  # Seconds; backend may itself wait on geocoding + weather upstream
+MAP_TIMEOUT = 10
+SUGGESTION_CACHE_SIZE = 200  # Max cached autocomplete queries
+MAP_CACHE_SIZE = 8           # Max decoded map images kept around
+FORECAST_DAYS = 5            # Forecast cards in the fixed widget pool
+
+class LRUCache(OrderedDict):
+    """Small size-bounded dict that evicts the least recently used entry."""
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            self.popitem(last=False)
+
+class SessionMonitor:
+    """Tracks memory (tracemalloc) and widget render times for long-running sessions."""
+    def __init__(self, root, history=100):
+        self.root = root
+        self.started = time.time()
+        self.render_times = deque(maxlen=history)
+        self.renders = 0
+        self.auto_refreshes = 0
+        self.failed_refreshes = 0
+        tracemalloc.start()
+        self.baseline = tracemalloc.take_snapshot()
+
+    def record_render(self, seconds):
+        """Record time spent updating widgets (network time is not included)."""
+        self.render_times.append(seconds)
+        self.renders += 1
+
+    def record_auto_refresh(self):
+        self.auto_refreshes += 1
+
+    def record_failed_refresh(self):
+        self.failed_refreshes += 1
+
+    def widget_count(self, widget=None):
+        widget = widget or self.root
+        return 1 + sum(self.widget_count(child) for child in widget.winfo_children())
+
+    def report(self, top=10):
+        """Return a text report of memory growth since startup and render timings."""
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"Uptime: {(time.time() - self.started) / 3600:.2f} h, "
+            f"auto-refreshes: {self.auto_refreshes} ({self.failed_refreshes} failed), renders: {self.renders}",
+            f"Traced memory: {current / 1024:.1f} KiB (peak {peak / 1024:.1f} KiB)",
+            f"Widgets: {self.widget_count()}",
+        ]
+        if self.render_times:
+            times = sorted(self.render_times)
+            lines.append(
+                f"Render time (last {len(times)}): "
+                f"min {times[0] * 1000:.0f} ms, median {times[len(times) // 2] * 1000:.0f} ms, "
+                f"max {times[-1] * 1000:.0f} ms"
+            )
+        lines.append(f"Top {top} allocation growth since startup:")
+        diff = tracemalloc.take_snapshot().compare_to(self.baseline, "lineno")
+        lines.extend(f"  {stat}" for stat in diff[:top])
+        return "\n".join(lines)
+
+    def dump(self, event=None):
+        print(self.report(), flush=True)
+
 class AutocompleteEntry(tk.Entry):
     def __init__(self, parent, *args, **kwargs):
         super().__init__(parent, *args, **kwargs)
         self.parent = parent
         self.listbox = None
+        self.listbox_visible = False
         self.suggestions = []
-        self.suggestion_cache = {}  # Cache for query -> suggestions
+        self.suggestion_cache = LRUCache(SUGGESTION_CACHE_SIZE)  # Cache for query -> suggestions
         self.debounce_id = None  # For debouncing API calls
         self.debounce_delay = 300  # Milliseconds to wait before API call
         self.bind("<KeyRelease>", self.on_keyrelease)
@@ -48,12 +131,13 @@ class AutocompleteEntry(tk.Entry):
     def fetch_and_update(self, query):
         """Fetch suggestions and update listbox."""
         # Check cache first
-        if query in self.suggestion_cache:
-            self.suggestions = self.suggestion_cache[query]
+        cached = self.suggestion_cache.get(query)
+        if cached is not None:
+            self.suggestions = cached
         else:
             # Fetch from API and cache result
             self.suggestions = self.fetch_suggestions(query)
-            self.suggestion_cache[query] = self.suggestions
+            self.suggestion_cache.put(query, self.suggestions)
         self.update_listbox()
 
     def fetch_suggestions(self, query):
@@ -71,28 +155,15 @@ class AutocompleteEntry(tk.Entry):
         except Exception:
             return []
 
-    def update_listbox(self):
-        """Update the dropdown listbox with current suggestions."""
-        self.hide_listbox()
-
-        if not self.suggestions:
-            return
-
-        # Create listbox
+    def create_listbox(self):
+        """Create the dropdown listbox once; it is reused for every update."""
         self.listbox = tk.Listbox(
             self.parent,
-            height=len(self.suggestions),
-            width=self.winfo_width() // 8,
             font=("Arial", 12),
             selectmode=tk.SINGLE,  # Ensure single selection
             selectbackground="#007bff",  # Highlight color
             selectforeground="white"  # Text color when highlighted
         )
-        self.listbox.place(x=self.winfo_x(), y=self.winfo_y() + self.winfo_height())
-
-        # Populate listbox
-        for suggestion in self.suggestions:
-            self.listbox.insert(tk.END, suggestion)
 
         # Bind listbox events
         self.listbox.bind("<Button-1>", self.on_select)  # Handle mouse click
@@ -101,9 +172,28 @@ class AutocompleteEntry(tk.Entry):
         self.listbox.bind("<Escape>", lambda e: self.hide_listbox())
         self.listbox.bind("<Motion>", self.on_motion)  # Handle mouse hover
 
+    def update_listbox(self):
+        """Update the dropdown listbox with current suggestions."""
+        self.hide_listbox()
+
+        if not self.suggestions:
+            return
+
+        if self.listbox is None:
+            self.create_listbox()
+
+        # Repopulate listbox
+        self.listbox.delete(0, tk.END)
+        for suggestion in self.suggestions:
+            self.listbox.insert(tk.END, suggestion)
+        self.listbox.config(height=len(self.suggestions), width=self.winfo_width() // 8)
+        self.listbox.place(x=self.winfo_x(), y=self.winfo_y() + self.winfo_height())
+        self.listbox.lift()
+        self.listbox_visible = True
+
     def on_motion(self, event):
         """Highlight the item under the cursor."""
-        if self.listbox:
+        if self.listbox_visible:
             # Get the index of the item under the cursor
             index = self.listbox.nearest(event.y)
             if index >= 0:  # Ensure valid index
@@ -112,14 +202,15 @@ class AutocompleteEntry(tk.Entry):
                 self.listbox.activate(index)  # Set active item for visual feedback
 
     def hide_listbox(self, event=None):
-        """Hide the listbox if it exists."""
-        if self.listbox:
-            self.listbox.destroy()
-            self.listbox = None
+        """Hide the listbox if it is shown."""
+        if self.listbox_visible:
+            self.listbox.place_forget()
+            self.listbox.selection_clear(0, tk.END)
+            self.listbox_visible = False
 
     def on_select(self, event=None):
         """Handle selection from listbox."""
-        if self.listbox and self.listbox.curselection():
+        if self.listbox_visible and self.listbox.curselection():
             index = self.listbox.curselection()[0]  # Get the index of the selected item
             selection = self.listbox.get(index)  # Get the text at the selected index
             self.delete(0, tk.END)
@@ -135,18 +226,26 @@ class AutocompleteEntry(tk.Entry):
 
     def move_to_listbox(self, event):
         """Move focus to listbox when Down arrow is pressed."""
-        if self.listbox:
+        if self.listbox_visible:
             self.listbox.focus_set()
             self.listbox.selection_clear(0, tk.END)
             self.listbox.selection_set(0)
             self.listbox.activate(0)
 class WeatherApp:
-    # ... (Your existing WeatherApp class remains unchanged)
-    def __init__(self, root):
+    def __init__(self, root, refresh_minutes=0, monitor=None):
         self.root = root
         self.root.title("Weather Dashboard")
         self.root.geometry("600x600")
         self.root.configure(bg="#f0f0f0")
+        self.refresh_ms = int(refresh_minutes * 60 * 1000)
+        self.refresh_id = None
+        self.last_city = None
+        self.current_key = None  # Backend watch-list key of the city on screen
+        self.current_pin = None  # {"city", "lat", "lon"} last pinned on the backend
+        self.rendered_version = 0  # Snapshot version already on screen; older pushes are skipped
+        self.updates = queue.Queue()  # Pushed snapshots from the backend listener thread
+        self.monitor = monitor
+        self.map_cache = LRUCache(MAP_CACHE_SIZE)  # (lat, lon) -> decoded PhotoImage
 
         self.label = tk.Label(root, text="Enter City:", bg="#f0f0f0", font=("Arial", 12))
         self.label.pack(pady=10)
@@ -164,121 +263,278 @@ class WeatherApp:
         self.result_label = tk.Label(root, text="", bg="#f0f0f0", font=("Arial", 12), wraplength=550)
         self.result_label.pack(pady=10)
 
+        # Fixed pool of forecast widgets, reconfigured on every refresh
         self.forecast_frame = tk.Frame(root, bg="#f0f0f0")
         self.forecast_frame.pack(pady=10)
-        self.forecast_labels = []
+        self.forecast_labels = [
+            tk.Label(
+                self.forecast_frame,
+                bg="#ffffff",
+                font=("Arial", 9),
+                width=15,
+                height=5,
+                relief="raised",
+                bd=1,
+                padx=5,
+                pady=5
+            )
+            for _ in range(FORECAST_DAYS)
+        ]
+        self.forecast_error_label = tk.Label(
+            self.forecast_frame,
+            bg="#f0f0f0",
+            font=("Arial", 9),
+            wraplength=550
+        )
 
         self.map_label = tk.Label(root, bg="#f0f0f0")
         self.map_label.pack(pady=10)
 
-    def fetch_weather(self):
-        # ... (Your existing fetch_weather method remains unchanged)
-        city = self.city_entry.get().strip()
+        if self.monitor:
+            self.root.bind("<F12>", self.monitor.dump)
+
+        threading.Thread(target=self.listen_for_updates, daemon=True).start()
+        self.root.after(250, self.drain_updates)
+
+    def listen_for_updates(self):
+        """Long-poll the backend for watch-list refreshes (runs off the Tk thread)."""
+        version = 0
+        instance = None
+        while True:
+            try:
+                response = requests.get(
+                    f"{BACKEND_URL}/api/updates", params={"since": version, "timeout": 25}, timeout=35
+                )
+                data = response.json()
+                if data.get("instance") != instance:
+                    if instance is not None:
+                        # Backend restarted and lost its watch-list; resync and pin the city on screen again
+                        self.updates.put({"reset": True})
+                        if self.current_pin:
+                            self.pin_location(self.current_pin)
+                        instance, version = data.get("instance"), 0
+                        continue
+                    instance = data.get("instance")
+                version = data["version"]
+                for update in data["updates"]:
+                    self.updates.put(update)
+            except Exception:
+                time.sleep(5)  # Backend not up yet; try again shortly
+
+    def drain_updates(self):
+        """Render pushed snapshots for the city on screen; Tk calls stay on the main thread."""
+        try:
+            while True:
+                try:
+                    update = self.updates.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    if update.get("reset"):
+                        self.rendered_version = 0
+                        continue
+                    if update.get("key") == self.current_key and update.get("version", 0) > self.rendered_version:
+                        self.rendered_version = update.get("version", 0)
+                        if update.get("weather"):
+                            self.render_weather(update["weather"])
+                        if update.get("forecast"):
+                            self.render_forecast(update["forecast"])
+                except Exception as e:
+                    print(f"Skipping malformed update: {e}")
+        finally:
+            self.root.after(250, self.drain_updates)
+
+    def pin_location(self, pin):
+        """Ask the backend to keep this location fresh so later clicks are served locally."""
+        try:
+            requests.post(f"{BACKEND_URL}/api/watch", json=pin, timeout=2)
+        except requests.exceptions.RequestException:
+            pass
+
+    def clear_forecast(self):
+        """Hide all pooled forecast widgets without destroying them."""
+        for label in self.forecast_labels:
+            label.grid_remove()
+        self.forecast_error_label.grid_remove()
+
+    def schedule_refresh(self):
+        """(Re)arm the auto-refresh timer for the last successfully queried city."""
+        if self.refresh_id:
+            self.root.after_cancel(self.refresh_id)
+            self.refresh_id = None
+        if self.refresh_ms > 0 and self.last_city:
+            self.refresh_id = self.root.after(self.refresh_ms, self.auto_refresh)
+
+    def auto_refresh(self):
+        self.refresh_id = None
+        if self.monitor:
+            self.monitor.record_auto_refresh()
+        self.fetch_weather(self.last_city, interactive=False)
+
+    def load_map(self, lat, lon):
+        """Return a decoded map image for the coordinates, reusing recent ones."""
+        key = (round(float(lat), 4), round(float(lon), 4))
+        map_photo = self.map_cache.get(key)
+        if map_photo is not None:
+            return map_photo
+
+        api_key = os.getenv("LocationIQKey")
+        if not api_key:
+            raise ValueError("LocationIQ API key not found in .env file")
+        map_url = (
+            f"https://maps.locationiq.com/v3/staticmap?"
+            f"key={api_key}&"
+            f"center={lat},{lon}&"
+            f"zoom=13&"
+            f"size=350x200&"
+            f"format=png&"
+            f"markers=icon:default|{lat},{lon}"
+        )
+        req = urllib.request.Request(
+            map_url,
+            headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
+        )
+        with urllib.request.urlopen(req, timeout=MAP_TIMEOUT) as u:
+            if u.getcode() == 401:
+                raise Exception("401 Unauthorized: Check your LocationIQ API key or restrictions.")
+            map_data = u.read()
+        with Image.open(BytesIO(map_data)) as img:
+            map_img = img.resize((350, 200), Image.LANCZOS)
+        map_photo = ImageTk.PhotoImage(map_img)
+        self.map_cache.put(key, map_photo)
+        return map_photo
+
+    def render_weather(self, data):
+        celsius = data['temp']
+        fahrenheit = (celsius * 9/5) + 32
+        description = re.sub(r'[^\w\s,.]', '', data['description']).capitalize()
+
+        result = (
+            f"{data['city']}\n"
+            f"Temperature: {fahrenheit:.1f} F\n"
+            f"Humidity: {data['humidity']}%\n"
+            f"Description: {description}"
+        )
+
+        lat = data.get("lat")
+        lon = data.get("lon")
+        self.last_lat, self.last_lon = lat, lon
+
+        # Download/decode the map first so only widget updates are timed
+        map_photo, map_text = None, ""
+        if lat and lon:
+            try:
+                map_photo = self.load_map(lat, lon)
+            except urllib.error.HTTPError as e:
+                if e.code == 401:
+                    map_text = "Map error: Invalid API key (401). Check dashboard."
+                else:
+                    map_text = f"Map error: {e.code}"
+            except Exception as e:
+                map_text = f"Map unavailable: {str(e)}"
+        else:
+            map_text = "Map unavailable (missing coordinates)."
+
+        started = time.perf_counter()
+        self.result_label.config(text=result)
+        self.map_label.config(image=map_photo or "", text=map_text)
+        self.map_label.image = map_photo
+        self.record_render(started)
+
+    def record_render(self, started):
+        if self.monitor:
+            self.root.update_idletasks()  # Include Tk's layout/redraw in the measurement
+            self.monitor.record_render(time.perf_counter() - started)
+
+    def render_forecast(self, forecast_data):
+        started = time.perf_counter()
+        self.clear_forecast()
+        for i, (label, item) in enumerate(zip(self.forecast_labels, forecast_data['forecast'])):
+            min_temp_f = (item['min_temp'] * 9/5) + 32
+            max_temp_f = (item['max_temp'] * 9/5) + 32
+            desc = re.sub(r'[^\w\s,.]', '', item['description']).capitalize()
+            forecast_text = f"{item['day']}\n{item['date']}\n{min_temp_f:.1f}-{max_temp_f:.1f} F\n{desc}"
+            label.config(text=forecast_text)
+            label.grid(row=0, column=i, padx=5)
+        self.record_render(started)
+
+    def render_forecast_error(self, text):
+        self.clear_forecast()
+        self.forecast_error_label.config(text=text)
+        self.forecast_error_label.grid(row=0, column=0, columnspan=FORECAST_DAYS)
+
+    def report_refresh_error(self, message):
+        """Auto-refresh has nobody to show a dialog to; log it and count it instead."""
+        print(f"Auto-refresh of {self.last_city} failed: {message}")
+        if self.monitor:
+            self.monitor.record_failed_refresh()
+
+    def fetch_weather(self, city=None, interactive=True):
+        city = city or self.city_entry.get().strip()
         if not city:
             messagebox.showerror("Error", "Please enter a city name")
             return
 
         try:
-            response = requests.post("http://localhost:5000/api/weather", json={"city": city})
+            response = requests.post(f"{BACKEND_URL}/api/weather", json={"city": city}, timeout=REQUEST_TIMEOUT)
             data = response.json()
 
             if response.status_code != 200:
-                messagebox.showerror("Error", data.get("error", "Unknown error"))
+                if interactive:
+                    messagebox.showerror("Error", data.get("error", "Unknown error"))
+                else:
+                    self.report_refresh_error(f"{response.status_code} {data.get('error', 'Unknown error')}")
                 return
 
-            celsius = data['temp']
-            fahrenheit = (celsius * 9/5) + 32
-            description = re.sub(r'[^\w\s,.]', '', data['description']).capitalize()
-
-            result = (
-                f"{data['city']}\n"
-                f"Temperature: {fahrenheit:.1f} F\n"
-                f"Humidity: {data['humidity']}%\n"
-                f"Description: {description}"
-            )
-            self.result_label.config(text=result)
-
-            for label in self.forecast_labels:
-                label.destroy()
-            self.forecast_labels.clear()
+            self.render_weather(data)
 
-            forecast_response = requests.post("http://localhost:5000/api/forecast", json={"city": city})
+            forecast_response = requests.post(f"{BACKEND_URL}/api/forecast", json={"city": city}, timeout=REQUEST_TIMEOUT)
+            forecast_version = 0
             if forecast_response.status_code == 200:
                 forecast_data = forecast_response.json()
-                for i, item in enumerate(forecast_data['forecast']):
-                    min_temp_f = (item['min_temp'] * 9/5) + 32
-                    max_temp_f = (item['max_temp'] * 9/5) + 32
-                    desc = re.sub(r'[^\w\s,.]', '', item['description']).capitalize()
-                    forecast_text = f"{item['day']}\n{item['date']}\n{min_temp_f:.1f}-{max_temp_f:.1f} F\n{desc}"
-                    label = tk.Label(
-                        self.forecast_frame,
-                        text=forecast_text,
-                        bg="#ffffff",
-                        font=("Arial", 9),
-                        width=15,
-                        height=5,
-                        relief="raised",
-                        bd=1,
-                        padx=5,
-                        pady=5
-                    )
-                    label.grid(row=0, column=i, padx=5)
-                    self.forecast_labels.append(label)
+                forecast_version = forecast_data.get("version", 0)
+                self.render_forecast(forecast_data)
             else:
-                error_label = tk.Label(
-                    self.forecast_frame,
-                    text=f"Forecast unavailable: {forecast_response.status_code} {forecast_response.text}",
-                    bg="#f0f0f0",
-                    font=("Arial", 9),
-                    wraplength=550
+                self.render_forecast_error(
+                    f"Forecast unavailable: {forecast_response.status_code} {forecast_response.text}"
                 )
-                error_label.grid(row=0, column=0, columnspan=5)
-                self.forecast_labels.append(error_label)
-
-            lat = data.get("lat")
-            lon = data.get("lon")
-            self.last_lat, self.last_lon = lat, lon
-
-            if lat and lon:
-                api_key = os.getenv("LocationIQKey")
-                if not api_key:
-                    raise ValueError("LocationIQ API key not found in .env file")
-                map_url = (
-                    f"https://maps.locationiq.com/v3/staticmap?"
-                    f"key={api_key}&"
-                    f"center={lat},{lon}&"
-                    f"zoom=13&"
-                    f"size=350x200&"
-                    f"format=png&"
-                    f"markers=icon:default|{lat},{lon}"
-                )
-                try:
-                    req = urllib.request.Request(
-                        map_url,
-                        headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"}
-                    )
-                    with urllib.request.urlopen(req) as u:
-                        if u.getcode() == 401:
-                            raise Exception("401 Unauthorized: Check your LocationIQ API key or restrictions.")
-                        map_data = u.read()
-                        map_img = Image.open(BytesIO(map_data)).resize((350, 200), Image.LANCZOS)
-                        map_photo = ImageTk.PhotoImage(map_img)
-                        self.map_label.config(image=map_photo)
-                    self.map_label.image = map_photo
-                except urllib.error.HTTPError as e:
-                    if e.code == 401:
-                        self.map_label.config(text="Map error: Invalid API key (401). Check dashboard.")
-                    else:
-                        self.map_label.config(text=f"Map error: {e.code}")
-                except Exception as e:
-                    self.map_label.config(text=f"Map unavailable: {str(e)}")
-            else:
-                self.map_label.config(text="Map unavailable (missing coordinates).")
+                if not interactive:
+                    self.report_refresh_error(f"forecast {forecast_response.status_code}")
+
+            self.last_city = city
+            if data.get("key"):
+                # Pin on every fetch: cheap and idempotent, and it restores the pin
+                # after a backend restart or a watch-list eviction
+                self.current_key = data["key"]
+                self.rendered_version = max(data.get("version", 0), forecast_version)
+                self.current_pin = {"city": data["city"], "lat": data["lat"], "lon": data["lon"]}
+                self.pin_location(self.current_pin)
 
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to fetch weather or map: {str(e)}")
+            if interactive:
+                messagebox.showerror("Error", f"Failed to fetch weather or map: {str(e)}")
+            else:
+                self.report_refresh_error(str(e))
+        finally:
+            self.schedule_refresh()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weather Dashboard")
+    parser.add_argument(
+        "--long-session", action="store_true",
+        help="kiosk mode: auto-refresh the last city and track memory/render times (F12 dumps a report)"
+    )
+    parser.add_argument(
+        "--refresh-minutes", type=float, default=15,
+        help="auto-refresh interval in long-session mode (default: 15)"
+    )
+    args = parser.parse_args()
+    if args.long_session and args.refresh_minutes <= 0:
+        parser.error("--refresh-minutes must be greater than 0")
+
     root = tk.Tk()
-    app = WeatherApp(root)
-    root.mainloop()
\ No newline at end of file
+    if args.long_session:
+        app = WeatherApp(root, refresh_minutes=args.refresh_minutes, monitor=SessionMonitor(root))
+    else:
+        app = WeatherApp(root)
+    root.mainloop()
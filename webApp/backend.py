@@ -3,8 +3,11 @@ from flask_cors import CORS
 import requests
 from dotenv import load_dotenv
 import os
+import sqlite3
+import tempfile
 from collections import defaultdict, Counter
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, date
 
 # =========================
 # Env & constants
@@ -18,6 +21,15 @@ LOCATIONIQ_KEY = os.getenv("LocationIQKey")
 VC_TIMELINE      = "https://weather.visualcrossing.com/VisualCrossingWebServices/rest/services/timeline/"
 LI_AUTOCOMP      = "https://api.locationiq.com/v1/autocomplete"
 
+# History store (on Lambda only /tmp is writable, so it lives for the container)
+HISTORY_DB_PATH     = os.getenv("HistoryDbPath") or os.path.join(tempfile.gettempdir(), "weather_history.sqlite3")
+HISTORY_CELL_DEG    = 0.01   # lat/lon grid used to key stored records (~1 km)
+HISTORY_CHUNK_DAYS  = 31     # max days per upstream timeline request
+HISTORY_MAX_DAYS    = 366 * 2
+HISTORY_WORKERS     = 4
+HISTORY_MAX_CHUNKS  = HISTORY_WORKERS * 2  # two rounds of 8s calls fit the ~30s API Gateway limit
+HISTORY_INCLUDES    = {"days", "hours", "monthly"}
+
 # =========================
 # Flask app
 # =========================
@@ -298,6 +310,283 @@ def get_forecast():
         print("Error in /api/forecast:", e)
         return jsonify({"error": "Error fetching forecast data"}), 500
 
+# =========================
+# History store
+# =========================
+def history_cell(lat: float, lon: float):
+    """Snap coordinates to the store grid so nearby lookups share records."""
+    return round(round(lat / HISTORY_CELL_DEG) * HISTORY_CELL_DEG, 4), round(round(lon / HISTORY_CELL_DEG) * HISTORY_CELL_DEG, 4)
+
+def history_db():
+    conn = sqlite3.connect(HISTORY_DB_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS history_days (
+            cell_lat REAL NOT NULL,
+            cell_lon REAL NOT NULL,
+            date TEXT NOT NULL,
+            tempmin REAL, tempmax REAL, temp REAL,
+            humidity REAL, precip REAL,
+            conditions TEXT, icon TEXT,
+            PRIMARY KEY (cell_lat, cell_lon, date)
+        );
+        CREATE TABLE IF NOT EXISTS history_hours (
+            cell_lat REAL NOT NULL,
+            cell_lon REAL NOT NULL,
+            date TEXT NOT NULL,
+            hour TEXT NOT NULL,
+            temp REAL, humidity REAL, precip REAL,
+            conditions TEXT, icon TEXT,
+            PRIMARY KEY (cell_lat, cell_lon, date, hour)
+        );
+        CREATE TABLE IF NOT EXISTS history_places (
+            query TEXT PRIMARY KEY,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            label TEXT
+        );
+    """)
+    return conn
+
+def history_stable_before():
+    """
+    First date that may still be in progress somewhere (UTC-12 lags UTC by a day).
+    Only days strictly before this are complete everywhere and safe to persist.
+    """
+    return datetime.utcnow().date() - timedelta(days=1)
+
+def history_day_row(d):
+    return {
+        "date": d.get("datetime"),
+        "tempmin": d.get("tempmin"),
+        "tempmax": d.get("tempmax"),
+        "temp": d.get("temp"),
+        "humidity": d.get("humidity"),
+        "precip": d.get("precip"),
+        "conditions": d.get("conditions", ""),
+        "icon": d.get("icon"),
+    }
+
+def history_hour_row(day_key, h):
+    return {
+        "date": day_key,
+        "hour": h.get("datetime"),
+        "temp": h.get("temp"),
+        "humidity": h.get("humidity"),
+        "precip": h.get("precip"),
+        "conditions": h.get("conditions", ""),
+        "icon": h.get("icon"),
+    }
+
+def history_chunks(dates):
+    """Group sorted dates into consecutive runs of at most HISTORY_CHUNK_DAYS days."""
+    chunks = []
+    for d in dates:
+        if chunks and d - chunks[-1][1] == timedelta(days=1) and (d - chunks[-1][0]).days < HISTORY_CHUNK_DAYS:
+            chunks[-1][1] = d
+        else:
+            chunks.append([d, d])
+    return [(a, b) for a, b in chunks]
+
+def fetch_history_chunk(cell_lat, cell_lon, start, end):
+    """Fetch one chunk upstream. Returns (days, hours) row lists; raises on provider error."""
+    date_range = f"{start.isoformat()}/{end.isoformat()}"
+    src, s_vc, vc = call_vc_timeline(cell_lat, cell_lon, date_range, "days,hours")
+    if s_vc != 200 or not isinstance(vc, dict):
+        raise RuntimeError(f"{src} returned {s_vc} for {date_range}")
+    days, hours = [], []
+    for d in vc.get("days", []):
+        if not d.get("datetime"):
+            continue
+        days.append(history_day_row(d))
+        hours.extend(history_hour_row(d["datetime"], h) for h in d.get("hours", []) if h.get("datetime"))
+    return days, hours
+
+def history_store(conn, cell_lat, cell_lon, days, hours):
+    """Append rows; existing (cell, date) records are never rewritten."""
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO history_days VALUES "
+            "(:cell_lat, :cell_lon, :date, :tempmin, :tempmax, :temp, :humidity, :precip, :conditions, :icon)",
+            [dict(r, cell_lat=cell_lat, cell_lon=cell_lon) for r in days],
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO history_hours VALUES "
+            "(:cell_lat, :cell_lon, :date, :hour, :temp, :humidity, :precip, :conditions, :icon)",
+            [dict(r, cell_lat=cell_lat, cell_lon=cell_lon) for r in hours],
+        )
+
+def ensure_history(conn, cell_lat, cell_lon, start, end):
+    """
+    Make sure every completed day in [start, end] is in the store, fetching only
+    the missing ones (in parallel chunks). Days too recent to persist are fetched
+    every time and returned as (days, hours) so the caller can merge them.
+    Each successful chunk is stored as soon as it arrives, so a failed chunk
+    only costs itself on retry. Failed ranges, and ranges past HISTORY_MAX_CHUNKS,
+    are returned as the third item.
+    """
+    stable_before = history_stable_before()
+    have = {
+        r["date"] for r in conn.execute(
+            "SELECT date FROM history_days WHERE cell_lat = ? AND cell_lon = ? AND date BETWEEN ? AND ?",
+            (cell_lat, cell_lon, start.isoformat(), end.isoformat()),
+        )
+    }
+    wanted = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    missing = [d for d in wanted if d < stable_before and d.isoformat() not in have]
+    recent = [d for d in wanted if d >= stable_before]
+
+    chunks = history_chunks(missing) + history_chunks(recent)
+    if not chunks:
+        return [], [], []
+
+    # Anything beyond what fits in one request's time limit is left for a retry
+    live_days, live_hours, failed = [], [], chunks[HISTORY_MAX_CHUNKS:]
+    chunks = chunks[:HISTORY_MAX_CHUNKS]
+    cutoff = stable_before.isoformat()
+    with ThreadPoolExecutor(max_workers=min(HISTORY_WORKERS, len(chunks))) as pool:
+        futures = {pool.submit(fetch_history_chunk, cell_lat, cell_lon, a, b): (a, b) for a, b in chunks}
+        for fut in as_completed(futures):
+            try:
+                days, hours = fut.result()
+            except Exception as e:
+                print("History chunk failed:", e)
+                failed.append(futures[fut])
+                continue
+            history_store(
+                conn, cell_lat, cell_lon,
+                [r for r in days if r["date"] < cutoff],
+                [r for r in hours if r["date"] < cutoff],
+            )
+            live_days.extend(r for r in days if r["date"] >= cutoff)
+            live_hours.extend(r for r in hours if r["date"] >= cutoff)
+    live_days.sort(key=lambda r: r["date"])
+    live_hours.sort(key=lambda r: (r["date"], r["hour"]))
+    return live_days, live_hours, sorted(failed)
+
+def history_coords(conn, body):
+    """get_coords, but city lookups are cached in the store so repeat queries stay local."""
+    if "lat" in body and "lon" in body:
+        return get_coords(body)
+    query = str(body["city"]).strip().lower()
+    row = conn.execute("SELECT lat, lon, label FROM history_places WHERE query = ?", (query,)).fetchone()
+    if row:
+        return row["lat"], row["lon"], row["label"]
+    lat, lon, label = get_coords(body)
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO history_places VALUES (?, ?, ?, ?)", (query, lat, lon, label))
+    return lat, lon, label
+
+def history_rows(conn, table, cell_lat, cell_lon, start, end):
+    order = "date, hour" if table == "history_hours" else "date"
+    cur = conn.execute(
+        f"SELECT * FROM {table} WHERE cell_lat = ? AND cell_lon = ? AND date BETWEEN ? AND ? ORDER BY {order}",
+        (cell_lat, cell_lon, start.isoformat(), end.isoformat()),
+    )
+    return [{k: r[k] for k in r.keys() if k not in ("cell_lat", "cell_lon")} for r in cur]
+
+def history_monthly(days):
+    """Monthly mean/extreme aggregates over daily rows."""
+    months = defaultdict(list)
+    for d in days:
+        months[d["date"][:7]].append(d)
+    out = []
+    for month in sorted(months):
+        rows = months[month]
+        temps = [r["temp"] for r in rows if r["temp"] is not None]
+        lows = [r["tempmin"] for r in rows if r["tempmin"] is not None]
+        highs = [r["tempmax"] for r in rows if r["tempmax"] is not None]
+        precip = [r["precip"] for r in rows if r["precip"] is not None]
+        out.append({
+            "month": month,
+            "days": len(rows),
+            "mean_temp": round(sum(temps) / len(temps), 1) if temps else None,
+            "mean_min_temp": round(sum(lows) / len(lows), 1) if lows else None,
+            "mean_max_temp": round(sum(highs) / len(highs), 1) if highs else None,
+            "min_temp": min(lows) if lows else None,
+            "max_temp": max(highs) if highs else None,
+            "total_precip": round(sum(precip), 1) if precip else None,
+        })
+    return out
+
+# =========================
+# /api/history
+# =========================
+@app.route("/api/history", methods=["POST"])
+def get_history():
+    """
+    Body: {city | lat/lon, "start": "YYYY-MM-DD", "end": "YYYY-MM-DD",
+           "include": "days" | "hours" | "monthly" (comma-separated, default "days")}
+    Past days are served from the local store; only gaps go upstream, at most
+    HISTORY_MAX_CHUNKS per request. If some chunks fail or are deferred, the rest is returned with "complete": false
+    and the failed ranges in "missing".
+    """
+    body = request.get_json(silent=True) or {}
+    try:
+        start = date.fromisoformat(str(body.get("start", "")))
+        end = date.fromisoformat(str(body.get("end", "")))
+    except ValueError:
+        return jsonify({"error": "Please provide 'start' and 'end' as YYYY-MM-DD."}), 400
+    if end < start:
+        return jsonify({"error": "'end' must not be before 'start'."}), 400
+    if end > datetime.utcnow().date() + timedelta(days=1):
+        return jsonify({"error": "'end' must not be in the future; use /api/forecast."}), 400
+    if (end - start).days + 1 > HISTORY_MAX_DAYS:
+        return jsonify({"error": f"Range too long (max {HISTORY_MAX_DAYS} days)."}), 400
+    include = {p.strip() for p in str(body.get("include", "days")).split(",") if p.strip()}
+    if not include or not include <= HISTORY_INCLUDES:
+        return jsonify({"error": f"'include' must be a comma-separated subset of {sorted(HISTORY_INCLUDES)}."}), 400
+
+    if "lat" in body or "lon" in body:
+        try:
+            lat, lon = float(body["lat"]), float(body["lon"])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "'lat' and 'lon' must both be numbers."}), 400
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return jsonify({"error": "'lat'/'lon' out of range."}), 400
+        body = {**body, "lat": lat, "lon": lon}
+    elif not body.get("city"):
+        return jsonify({"error": "Please provide lat/lon or a city name."}), 400
+
+    try:
+        conn = history_db()
+        try:
+            try:
+                lat, lon, label = history_coords(conn, body)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 404
+
+            cell_lat, cell_lon = history_cell(lat, lon)
+            live_days, live_hours, failed = ensure_history(conn, cell_lat, cell_lon, start, end)
+            days = history_rows(conn, "history_days", cell_lat, cell_lon, start, end) + live_days
+            hours = (history_rows(conn, "history_hours", cell_lat, cell_lon, start, end) + live_hours
+                     if "hours" in include else [])
+        finally:
+            conn.close()
+
+        resp = {
+            "units": "metric",
+            "city": label,
+            "lat": cell_lat,
+            "lon": cell_lon,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "complete": not failed,
+        }
+        if failed:
+            resp["missing"] = [f"{a.isoformat()}/{b.isoformat()}" for a, b in failed]
+        if "days" in include:
+            resp["days"] = days
+        if "hours" in include:
+            resp["hours"] = hours
+        if "monthly" in include:
+            resp["monthly"] = history_monthly(days)
+        return jsonify(resp), 200
+
+    except Exception as e:
+        print("Error in /api/history:", e)
+        return jsonify({"error": "Error fetching history data"}), 500
+
 # =========================
 # Local dev
 # =========================